@@ -0,0 +1,94 @@
+# graph/_dfs_numba.py
+
+import numpy as np
+
+try:
+    from numba import njit, boolean, int32, uint8
+    HAVE_NUMBA = True
+except ImportError:  # optional: the kernel then runs as plain Python
+    HAVE_NUMBA = False
+
+# Edge type bit flags of the compiled edge arrays
+AND_FLAG = 1
+IMPLIES_FLAG = 2
+OR_FLAG = 4
+NOT_FLAG = 8
+AND_IMPLIES_MASK = AND_FLAG | IMPLIES_FLAG
+# Code of compiled edges removed by pruning: no flag set, so never matched
+TOMBSTONE = 0
+
+if HAVE_NUMBA:
+    # Explicit signature: compiled once at import (and cached on disk)
+    # instead of on the first call
+    _jit = njit(int32(int32[:], int32[:], uint8[:], boolean[:], int32[:], int32, int32[:]),
+                cache=True)
+else:
+    def _jit(fn):
+        return fn
+
+
+@_jit
+def dfs_csc(in_row_ptr, in_col_ind, in_edge_type, visited_mask, or_rank, goal_idx, out_path):
+    """
+    Resolves the dependencies of goal_idx over the CSC incoming-edge arrays.
+    Writes the resolved node indices to out_path in order and returns how
+    many were written.
+
+    visited_mask[i] blocks dependents of i through NOT edges; or_rank[i]
+    orders OR alternatives (lowest rank wins).
+    """
+    n = in_row_ptr.shape[0] - 1
+    seen = np.zeros(n, dtype=np.bool_)
+    # Every expansion pushes at most two entries plus one per incoming edge.
+    # Entries >= 0 expand a node, entries < 0 (-i - 1) emit node i.
+    stack = np.empty(in_col_ind.shape[0] + 2 * n + 1, dtype=np.int32)
+    stack[0] = goal_idx
+    top = 1
+    count = 0
+
+    while top > 0:
+        top -= 1
+        v = stack[top]
+        if v < 0:
+            out_path[count] = -v - 1
+            count += 1
+            continue
+        # A node can be pushed by several dependents before it is expanded
+        if seen[v]:
+            continue
+        seen[v] = True
+
+        stack[top] = -v - 1
+        top += 1
+        # Slot for the OR dependency, below the AND/IMPLIES ones so it
+        # resolves last. v itself is a no-op placeholder as it is seen.
+        or_slot = top
+        stack[top] = v
+        top += 1
+
+        # Single pass over the predecessors, walked backwards so AND/IMPLIES
+        # dependencies pop in edge order
+        blocked = False
+        chosen = -1
+        for k in range(in_row_ptr[v + 1] - 1, in_row_ptr[v] - 1, -1):
+            t = in_edge_type[k]
+            s = in_col_ind[k]
+            if t & NOT_FLAG:
+                if visited_mask[s]:
+                    blocked = True
+                    break
+            elif t & AND_IMPLIES_MASK:
+                if not seen[s]:
+                    stack[top] = s
+                    top += 1
+            elif t & OR_FLAG:
+                if chosen < 0 or or_rank[s] < or_rank[chosen]:
+                    chosen = s
+
+        if blocked:
+            # Drop everything pushed for v, including its emit entry
+            top = or_slot - 1
+        elif chosen >= 0 and not seen[chosen]:
+            stack[or_slot] = chosen
+
+    return count
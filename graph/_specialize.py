@@ -0,0 +1,54 @@
+# graph/_specialize.py
+
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+from graph._dfs_numba import AND_IMPLIES_MASK, OR_FLAG, NOT_FLAG
+
+
+def specialize_traversal(in_row_ptr: np.ndarray, in_col_ind: np.ndarray, in_edge_type: np.ndarray,
+                         or_rank: np.ndarray, live: Sequence[bool]) -> Callable[[int, List[bool]], List[int]]:
+    """
+    Generates a traversal function specialized to one graph shape: each live
+    node gets its own function with its NOT checks, AND/IMPLIES calls and
+    chosen OR call hard-coded, following the same rules as dfs_csc.
+
+    The returned traverse(goal_idx, visited_flags) gives the resolved node
+    indices in order. Deep graphs can raise RecursionError.
+    """
+    n = len(in_row_ptr) - 1
+    lines: List[str] = []
+    for v in range(n):
+        if not live[v]:
+            continue
+        start, end = int(in_row_ptr[v]), int(in_row_ptr[v + 1])
+        sources = in_col_ind[start:end].tolist()
+        types = in_edge_type[start:end].tolist()
+        not_sources = [s for s, t in zip(sources, types) if t & NOT_FLAG]
+        and_sources = [s for s, t in zip(sources, types) if t & AND_IMPLIES_MASK]
+        or_sources = [s for s, t in zip(sources, types) if t & OR_FLAG]
+
+        lines.append(f"def _v{v}(seen, path, flags):")
+        lines.append(f"    seen[{v}] = True")
+        if not_sources:
+            lines.append(f"    if {' or '.join(f'flags[{s}]' for s in not_sources)}:")
+            lines.append("        return")
+        for s in and_sources:
+            lines.append(f"    if not seen[{s}]: _v{s}(seen, path, flags)")
+        if or_sources:
+            chosen = min(or_sources, key=or_rank.__getitem__)
+            lines.append(f"    if not seen[{chosen}]: _v{chosen}(seen, path, flags)")
+        lines.append(f"    path.append({v})")
+
+    table = "".join(f"_v{v}, " if live[v] else "None, " for v in range(n))
+    lines.append(f"_TABLE = ({table})")
+    lines.append("def traverse(goal, flags):")
+    lines.append(f"    seen = [False] * {n}")
+    lines.append("    path = []")
+    lines.append("    _TABLE[goal](seen, path, flags)")
+    lines.append("    return path")
+
+    namespace: dict = {}
+    exec(compile("\n".join(lines), "<specialized traversal>", "exec"), namespace)
+    return namespace["traverse"]
@@ -1,9 +1,21 @@
 # graph/knowledge_graph.py
 
+from array import array
 from enum import Enum
-from typing import Dict, List, Set, Any
+from typing import Any, Dict, List, Optional, Set, Tuple
 import json
 import os
+import sys
+
+import numpy as np
+
+from graph._dfs_numba import dfs_csc, HAVE_NUMBA, AND_FLAG, OR_FLAG, IMPLIES_FLAG, NOT_FLAG, TOMBSTONE
+from graph._specialize import specialize_traversal
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib json module
+    orjson = None
 
 class EdgeType(Enum):
     AND = "AND"
@@ -12,21 +24,168 @@ class EdgeType(Enum):
     NOT = "NOT"
 
 
+# Bit flag codes used by the compiled (CSR) edge arrays
+EDGE_TYPE_CODES: Dict[EdgeType, int] = {
+    EdgeType.AND: AND_FLAG,
+    EdgeType.OR: OR_FLAG,
+    EdgeType.IMPLIES: IMPLIES_FLAG,
+    EdgeType.NOT: NOT_FLAG,
+}
+EDGE_TYPES_BY_CODE: Dict[int, EdgeType] = {code: t for t, code in EDGE_TYPE_CODES.items()}
+# Traversals against an unchanged graph shape before generating specialized
+# code for it (without numba); until then the kernel is used
+SPECIALIZE_AFTER = 8
+# Traversal results kept per graph; oldest entries are dropped first
+TRAVERSAL_CACHE_SIZE = 256
+
+
+def _intern(node_id: str) -> str:
+    # Interned ids share one object, so dict lookups hit the identity fast path
+    return sys.intern(node_id) if type(node_id) is str else node_id
+
+
+# Node.data keys mirrored by the owning graph
+FLAG_KEYS = frozenset(("visited", "failed"))
+
+
+class NodeData(dict):
+    """
+    Dict for Node.data that reports changes to its "visited"/"failed" keys
+    to the owning graph, which mirrors them into its own arrays. Writes to
+    any other key stay as cheap as on a plain dict.
+    """
+
+    # Node whose data this is, set by the node itself
+    __slots__ = ("_owner",)
+
+    def _changed(self):
+        owner = getattr(self, "_owner", None)
+        # Stale dicts (replaced, or shallow copies) are ignored
+        if owner is not None and owner._graph is not None and owner._data is self:
+            owner._graph._data_changed(owner)
+
+    # Plain dict calls below: this sits on the path of every data write
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        if key in FLAG_KEYS:
+            self._changed()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        if key in FLAG_KEYS:
+            self._changed()
+
+    def setdefault(self, key, default=None):
+        value = dict.setdefault(self, key, default)
+        if key in FLAG_KEYS:
+            self._changed()
+        return value
+
+    def pop(self, key, *default):
+        value = dict.pop(self, key, *default)
+        if key in FLAG_KEYS:
+            self._changed()
+        return value
+
+    def popitem(self):
+        item = dict.popitem(self)
+        if item[0] in FLAG_KEYS:
+            self._changed()
+        return item
+
+    def update(self, other=(), /, **kwargs):
+        if kwargs or type(other) is not dict:
+            self._bulk_write(dict.update, other, **kwargs)
+        else:
+            dict.update(self, other)
+            if "visited" in other or "failed" in other:
+                self._changed()
+
+    def __ior__(self, other):
+        self._bulk_write(dict.__ior__, other)
+        return self
+
+    def clear(self):
+        flagged = "visited" in self or "failed" in self
+        dict.clear(self)
+        if flagged:
+            self._changed()
+
+    def _bulk_write(self, write, /, *args, **kwargs):
+        # Keys written are not known up front: compare the flags around it
+        get = self.get
+        visited, failed = get("visited"), get("failed")
+        write(self, *args, **kwargs)
+        if get("visited") is not visited or get("failed") is not failed:
+            self._changed()
+
+    def __reduce__(self):
+        # Copies keep a reference to their (copied) node, so the graph that
+        # owns it keeps seeing writes
+        return (NodeData, (dict(self),), (None, {"_owner": getattr(self, "_owner", None)}))
+
+
 class Node:
     def __init__(self, node_id: str, node_type: str, data: Dict[str, Any] = None):
         self.id = node_id
         self.type = node_type  # e.g., 'event', 'context', 'tool', etc.
-        self.data = data or {}  # Extra info (e.g., coordinates, model path)
-        self.edges: List['Edge'] = []
+        # Owning graph; None for standalone and pruned nodes
+        self._graph: Optional['KnowledgeGraph'] = None
+        # Extra info (e.g., coordinates, model path); see the data setter
+        self._data = NodeData(data or ())
+        self._data._owner = self
+        # Outgoing edges as parallel compact arrays: target node index and
+        # edge type code. Indices refer to the owning graph's node table.
+        self.index = -1
+        self.target_idx = array('i')
+        self.type_code = array('B')
+
+    @property
+    def data(self) -> NodeData:
+        return self._data
+
+    @data.setter
+    def data(self, value: Dict[str, Any]):
+        # Always a NodeData copy, so writes through it are seen by the graph
+        self._data = data = NodeData(value)
+        data._owner = self
+        if self._graph is not None:
+            data._changed()
+
+    # Edges added while the node is not part of a graph
+    _loose_edges: Tuple['Edge', ...] = ()
+
+    @property
+    def edges(self) -> Tuple['Edge', ...]:
+        # Edge objects are only materialized on demand; read-only, edges
+        # are added through add_edge
+        if self._graph is None:
+            return self._loose_edges
+        table = self._graph._node_table
+        return tuple(Edge(self, table[t], EDGE_TYPES_BY_CODE[c])
+                     for t, c in zip(self.target_idx, self.type_code))
 
     def add_edge(self, edge: 'Edge'):
-        self.edges.append(edge)
+        if self._graph is None:
+            self._loose_edges += (edge,)
+        elif edge.target._graph is not self._graph:
+            raise ValueError(f"Edge target '{edge.target.id}' is not in this node's graph")
+        else:
+            self._graph.add_edge(self.id, edge.target.id, edge.type)
+
+    def _drop_targets(self, targets: Set[int]):
+        kept = [(t, c) for t, c in zip(self.target_idx, self.type_code) if t not in targets]
+        self.target_idx = array('i', [t for t, _ in kept])
+        self.type_code = array('B', [c for _, c in kept])
 
     def __repr__(self):
         return f"Node({self.id}, type={self.type})"
 
 
 class Edge:
+    # Plain record; only built on demand by Node.edges, never stored by the graph
+    __slots__ = ("source", "target", "type")
+
     def __init__(self, source: Node, target: Node, edge_type: EdgeType):
         self.source = source
         self.target = target
@@ -39,17 +198,140 @@ class Edge:
 class KnowledgeGraph:
     def __init__(self):
         self.nodes: Dict[str, Node] = {}
+        # Node ids are interned to stable int indices when added. Pruned
+        # nodes leave a None hole in the table; their index is never reused.
+        self._index: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._node_table: List[Optional[Node]] = []
+        self._reset_flags()
+        # Bumped on every mutation; keys the traversal cache
+        self._version = 0
+        self._paths: Dict[Tuple[str, int], Tuple[str, ...]] = {}
+        # Output directories already created by save_to_json
+        self._known_dirs: Set[str] = set()
+        self._invalidate()
+
+    def _reset_flags(self):
+        # data["visited"] / data["failed"] mirrored as one byte per node index.
+        # Plain bytearrays keep single writes cheap; traversal and pruning
+        # read them as bool arrays through np.frombuffer without copying.
+        self._visited = bytearray()
+        self._failed = bytearray()
+
+    def _write_flags(self, i: int, data: Dict[str, Any]):
+        self._visited[i] = bool(data.get("visited", False))
+        self._failed[i] = data.get("failed") is True
+
+    def _data_changed(self, node: Node):
+        # Called when node.data's flag keys change; ignores nodes no longer in the graph
+        i = node.index
+        if i >= len(self._node_table) or self._node_table[i] is not node:
+            return
+        visited = self._visited[i]
+        self._write_flags(i, node.data)
+        # Only "visited" feeds into traversal results
+        if self._visited[i] != visited:
+            self._version += 1
+
+    def _drop_specialized(self):
+        # Edges changed: forget the generated traversal and restart the count
+        # of queries against the current shape
+        self._compiled = None
+        self._shape_queries = 0
+
+    def _invalidate(self):
+        # Drop the compiled CSR arrays; they are rebuilt on next use
+        self._csr_dirty = True
+        self._row_ptr = None
+        self._col_ind = None
+        self._edge_type = None
+        self._in_row_ptr = None
+        self._in_col_ind = None
+        self._in_edge_type = None
+        self._or_rank = None
+        self._drop_specialized()
+
+    def _compile_csr(self):
+        """
+        Compiles outgoing edges into CSR arrays:
+        row_ptr[N+1] (int32), col_ind[E] (int32) and edge_type[E] (uint8).
+        Edges of node i live in col_ind[row_ptr[i]:row_ptr[i+1]].
+        A CSC mirror (in_row_ptr, in_col_ind, in_edge_type) holds the
+        incoming edges of node i, by source, in in_col_ind[in_row_ptr[i]:in_row_ptr[i+1]].
+        """
+        if not self._csr_dirty:
+            return
+        n = len(self._node_table)
+        live = [node for node in self._node_table if node is not None]
+
+        # Pass 1: out-degrees, then exclusive scan into row_ptr
+        row_ptr = np.zeros(n + 1, dtype=np.int32)
+        row_ptr[[node.index + 1 for node in live]] = [len(node.target_idx) for node in live]
+        np.cumsum(row_ptr, out=row_ptr)
+
+        # Pass 2: the per-node arrays already hold each row; concatenate them
+        targets, codes = array('i'), array('B')
+        for node in live:
+            targets.extend(node.target_idx)
+            codes.extend(node.type_code)
+        col_ind = np.frombuffer(targets, dtype=np.intc).astype(np.int32, copy=False)
+        edge_type = np.frombuffer(codes, dtype=np.uint8)
+
+        self._install_csr(row_ptr, col_ind, edge_type)
+
+    def _install_csr(self, row_ptr: np.ndarray, col_ind: np.ndarray, edge_type: np.ndarray):
+        # Adopts freshly built CSR arrays and derives the CSC mirror and OR ranks
+        n = len(row_ptr) - 1
+
+        # CSC mirror: counting sort on targets. A stable sort keeps sources in
+        # row order, so incoming edges are seen in the same order as before.
+        in_row_ptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(col_ind, minlength=n), out=in_row_ptr[1:])
+        order = np.argsort(col_ind, kind="stable")
+        sources = np.repeat(np.arange(n, dtype=np.int32), np.diff(row_ptr))
+
+        self._row_ptr = row_ptr
+        self._col_ind = col_ind
+        self._edge_type = edge_type
+        self._in_row_ptr = in_row_ptr
+        self._in_col_ind = sources[order]
+        self._in_edge_type = edge_type[order]
+
+        # Alphabetical rank among OR sources, used to pick between OR
+        # alternatives with a single min scan. Only OR sources are ever
+        # compared, so only those are sorted.
+        or_sources = np.unique(self._in_col_ind[(self._in_edge_type & OR_FLAG) != 0]).tolist()
+        or_rank = np.zeros(n, dtype=np.int32)
+        or_rank[sorted(or_sources, key=self._ids.__getitem__)] = np.arange(len(or_sources), dtype=np.int32)
+        self._or_rank = or_rank
+        self._drop_specialized()
+        self._csr_dirty = False
 
     def add_node(self, node_id: str, node_type: str, data: Dict[str, Any] = None):
+        node_id = _intern(node_id)
         if node_id not in self.nodes:
-            self.nodes[node_id] = Node(node_id, node_type, data)
+            node = Node(node_id, node_type, data)
+            node.index = len(self._node_table)
+            self._index[node_id] = node.index
+            self._ids.append(node_id)
+            self._node_table.append(node)
+            self.nodes[node_id] = node
+            data = node._data
+            self._visited.append(bool(data.get("visited", False)))
+            self._failed.append(data.get("failed") is True)
+            node._graph = self
+            self._csr_dirty = True
+            self._version += 1
         return self.nodes[node_id]
 
     def add_edge(self, source_id: str, target_id: str, edge_type: EdgeType):
         source = self.nodes[source_id]
         target = self.nodes[target_id]
-        edge = Edge(source, target, edge_type)
-        source.add_edge(edge)
+        # Appends straight to the compact arrays, no Edge object is built
+        source.target_idx.append(target.index)
+        source.type_code.append(EDGE_TYPE_CODES[edge_type])
+        self._csr_dirty = True
+        self._version += 1
         
     def update_node(self, node_id: str, node_type: str = None, data: Dict[str, Any] = None):
         node = self.get_node(node_id)
@@ -58,24 +340,97 @@ class KnowledgeGraph:
         if node_type:
             node.type = node_type
         if data:
-            node.data.update(data)
+            node.data.update(data)  # flags (and the version) are updated by NodeData
             
+    def _tombstone(self, i: int) -> Set[int]:
+        """
+        Marks every compiled edge to or from node index i as removed and
+        returns the indices of its live predecessors. Only the CSR/CSC rows
+        of i and of its neighbours are touched.
+        """
+        row_ptr, col_ind, edge_type = self._row_ptr, self._col_ind, self._edge_type
+        in_row_ptr, in_col_ind, in_edge_type = self._in_row_ptr, self._in_col_ind, self._in_edge_type
+
+        start, end = in_row_ptr[i], in_row_ptr[i + 1]
+        preds = set(in_col_ind[start:end][in_edge_type[start:end] != TOMBSTONE].tolist())
+        start, end = row_ptr[i], row_ptr[i + 1]
+        succs = set(col_ind[start:end][edge_type[start:end] != TOMBSTONE].tolist())
+
+        # Edges p -> i in the CSR rows of the predecessors
+        for p in preds:
+            start, end = row_ptr[p], row_ptr[p + 1]
+            edge_type[start:end][col_ind[start:end] == i] = TOMBSTONE
+        # Edges i -> t in the CSC rows of the successors
+        for t in succs:
+            start, end = in_row_ptr[t], in_row_ptr[t + 1]
+            in_edge_type[start:end][in_col_ind[start:end] == i] = TOMBSTONE
+        edge_type[row_ptr[i]:row_ptr[i + 1]] = TOMBSTONE
+        in_edge_type[in_row_ptr[i]:in_row_ptr[i + 1]] = TOMBSTONE
+        self._drop_specialized()
+
+        preds.discard(i)
+        return preds
+
     def prune_node(self, node_id: str):
         # Remove node and all edges pointing to or from it
         if node_id not in self.nodes:
             return
-        del_node = self.nodes[node_id]
-        # Remove edges from other nodes pointing to this one
-        for node in self.nodes.values():
-            node.edges = [e for e in node.edges if e.target.id != node_id]
-        # Remove the node itself
-        del self.nodes[node_id]
+        self._prune_indices([self._index[node_id]])
         
     def prune_failed_nodes(self):
-        to_remove = [node_id for node_id, node in self.nodes.items()
-                    if node.data.get("failed") is True]
-        for node_id in to_remove:
-            self.prune_node(node_id)
+        idxs = np.flatnonzero(np.frombuffer(self._failed, dtype=np.bool_))
+        if len(idxs):
+            self._prune_indices(idxs.tolist())
+
+    def _compact_without(self, idxs: List[int]) -> Set[int]:
+        """
+        Drops every compiled edge to or from the given node indices (and any
+        tombstones) with vectorized masks over the CSR and CSC arrays, and
+        returns the live predecessors that lost an edge.
+        """
+        keep = np.ones(len(self._row_ptr) - 1, dtype=np.bool_)
+        keep[idxs] = False
+
+        def compact(ptr, ind, types):
+            rows = np.repeat(np.arange(len(ptr) - 1, dtype=np.int32), np.diff(ptr))
+            mask = keep[rows] & keep[ind] & (types != TOMBSTONE)
+            # New row pointers from the running count of surviving edges
+            kept = np.zeros(len(mask) + 1, dtype=np.int32)
+            np.cumsum(mask, out=kept[1:])
+            return kept[ptr], ind[mask], types[mask]
+
+        # Predecessors: live sources of live edges into a removed node
+        targets = np.repeat(np.arange(len(keep), dtype=np.int32), np.diff(self._in_row_ptr))
+        lost = ~keep[targets] & keep[self._in_col_ind] & (self._in_edge_type != TOMBSTONE)
+        preds = set(np.unique(self._in_col_ind[lost]).tolist())
+
+        self._row_ptr, self._col_ind, self._edge_type = compact(
+            self._row_ptr, self._col_ind, self._edge_type)
+        self._in_row_ptr, self._in_col_ind, self._in_edge_type = compact(
+            self._in_row_ptr, self._in_col_ind, self._in_edge_type)
+        self._drop_specialized()
+        return preds
+
+    def _prune_indices(self, idxs: List[int]):
+        self._compile_csr()
+        removed = set(idxs)
+        if len(removed) == 1:
+            # A single node only touches its neighbours' rows
+            preds = self._tombstone(idxs[0])
+        else:
+            preds = self._compact_without(idxs)
+        # Filter each surviving predecessor's edge arrays once for the whole batch
+        for p in preds - removed:
+            self._node_table[p]._drop_targets(removed)
+        # Remove the nodes themselves
+        for i in removed:
+            node_id = self._node_table[i].id
+            del self.nodes[node_id]
+            del self._index[node_id]
+            self._node_table[i]._graph = None
+            self._node_table[i] = None
+            self._visited[i] = self._failed[i] = False
+        self._version += 1
 
     def get_node(self, node_id: str) -> Node:
         return self.nodes.get(node_id)
@@ -85,79 +440,147 @@ class KnowledgeGraph:
         Resolves all required steps to achieve a goal.
         For AND/IMPLIES edges: traverse all sources.
         For OR edges: just follow one source (prioritize alphabetically for now).
+        Results are cached per graph version; any change to the structure or
+        to a node's "visited" flag starts a new version.
         """
-        path: List[str] = []
-        visited: Set[str] = set()
-
-        def dfs(node: Node):
-            if node.id in visited:
-                return
-            visited.add(node.id)
-
-            # Find incoming edges to this node
-            incoming = []
-            for other_node in self.nodes.values():
-                for edge in other_node.edges:
-                    if edge.target.id == node.id:
-                        incoming.append((edge, other_node))
-
-            # Group edges by type
-            and_edges = [(e, n) for e, n in incoming if e.type in {EdgeType.AND, EdgeType.IMPLIES}]
-            or_edges = [(e, n) for e, n in incoming if e.type == EdgeType.OR]
-            not_edges = [(e, n) for e, n in incoming if e.type == EdgeType.NOT]
-
-            # If any NOT source is visited, block this node
-            for _, source_node in not_edges:
-                if source_node.data.get("visited", False):
-                    return 
-
-            # Resolve all AND/IMPLIES dependencies
-            for edge, source_node in and_edges:
-                dfs(source_node)
-
-            # Resolve only one OR dependency (e.g., pick first alphabetically for now)
-            if or_edges:
-                chosen = sorted(or_edges, key=lambda tup: tup[1].id)[0]
-                dfs(chosen[1])
-
-            path.append(node.id)
+        key = (goal_id, self._version)
+        path = self._paths.get(key)
+        if path is None:
+            path = self._traverse(goal_id)
+            if len(self._paths) >= TRAVERSAL_CACHE_SIZE:
+                # Entries of past versions are never hit again
+                del self._paths[next(iter(self._paths))]
+            self._paths[key] = path
+        return list(path)
 
+    def _traverse(self, goal_id: str) -> Tuple[str, ...]:
         goal_node = self.get_node(goal_id)
-        if goal_node:
-            dfs(goal_node)
-        return path
+        if not goal_node:
+            return ()
+
+        self._compile_csr()
+        ids = self._ids
+        visited_mask = np.frombuffer(self._visited, dtype=np.bool_)
+        goal_idx = self._index[goal_id]
+
+        # Without numba, a traversal specialized to the current graph shape
+        # beats interpreting the kernel, but generating it costs a pass over
+        # the whole graph. Only do so once the shape has served a few queries.
+        # `_compiled` is False when the shape is too deep for the generated
+        # (recursive) code, so it is not retried until the edges change.
+        if not HAVE_NUMBA and self._compiled is not False:
+            self._shape_queries += 1
+            if self._compiled is None and self._shape_queries > SPECIALIZE_AFTER:
+                live = [node is not None for node in self._node_table]
+                self._compiled = specialize_traversal(self._in_row_ptr, self._in_col_ind,
+                                                      self._in_edge_type, self._or_rank, live)
+            if self._compiled is not None:
+                try:
+                    return tuple(ids[i] for i in self._compiled(goal_idx, visited_mask.tolist()))
+                except RecursionError:
+                    # Dependency chain deeper than the interpreter stack
+                    self._compiled = False
+
+        out_path = np.empty(len(ids), dtype=np.int32)
+        count = dfs_csc(self._in_row_ptr, self._in_col_ind, self._in_edge_type, visited_mask,
+                        self._or_rank, goal_idx, out_path)
+        return tuple(ids[i] for i in out_path[:count].tolist())
     
     def save_to_json(self, filepath: str):
-        # Ensure parent directory exists
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-
-        data = {
-            "nodes": [
-                {"id": node.id, "type": node.type, "data": node.data}
-                for node in self.nodes.values()
-            ],
-            "edges": [
-                {"source": edge.source.id, "target": edge.target.id, "type": edge.type.value}
-                for node in self.nodes.values()
-                for edge in node.edges
-            ]
-        }
-        with open(filepath, "w") as f:
-            json.dump(data, f, indent=2)
+        # Ensure parent directory exists (once per directory for repeated saves)
+        directory = os.path.dirname(filepath)
+        if directory not in self._known_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._known_dirs.add(directory)
+
+        if orjson is not None:
+            def dump(record):
+                return orjson.dumps(record, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        else:
+            def dump(record):
+                return json.dumps(record, indent=2).encode("utf-8")
+
+        nodes = ({"id": node.id, "type": node.type, "data": node.data}
+                 for node in self.nodes.values())
+        edges = ({"source": node.id, "target": self._ids[t], "type": EDGE_TYPES_BY_CODE[c].value}
+                 for node in self.nodes.values()
+                 for t, c in zip(node.target_idx, node.type_code))
+
+        try:
+            f = open(filepath, "wb")
+        except FileNotFoundError:
+            # The directory was removed since it was first created; recreate it once
+            self._known_dirs.discard(directory)
+            os.makedirs(directory, exist_ok=True)
+            self._known_dirs.add(directory)
+            f = open(filepath, "wb")
+
+        # Stream one record at a time instead of building the whole document;
+        # the output matches dumping {"nodes": [...], "edges": [...]} with indent=2
+        with f:
+            f.write(b'{\n')
+            self._write_json_array(f, b"nodes", nodes, dump)
+            f.write(b',\n')
+            self._write_json_array(f, b"edges", edges, dump)
+            f.write(b'\n}')
+
+    @staticmethod
+    def _write_json_array(f, key: bytes, records, dump):
+        f.write(b'  "' + key + b'": [')
+        empty = True
+        for record in records:
+            f.write(b'\n    ' if empty else b',\n    ')
+            # Records are dumped at top level; indent them two levels deeper
+            f.write(dump(record).replace(b'\n', b'\n    '))
+            empty = False
+        f.write(b']' if empty else b'\n  ]')
 
     def load_from_json(self, filepath: str):
-        with open(filepath, "r") as f:
-            data = json.load(f)
+        with open(filepath, "rb") as f:
+            raw = f.read()
+        data = orjson.loads(raw) if orjson is not None else json.loads(raw)
 
+        for node in self.nodes.values():
+            node._graph = None
         self.nodes = {}  # clear current graph
+        self._index, self._ids, self._node_table = {}, [], []
+        self._reset_flags()
+        self._invalidate()
+        self._version += 1
 
-        # Add all nodes first
+        # Add all nodes first; ids are interned in file order
         for node in data["nodes"]:
             self.add_node(node["id"], node["type"], node.get("data", {}))
 
-        # Then add edges
-        for edge in data["edges"]:
-            self.add_edge(edge["source"], edge["target"], EdgeType(edge["type"]))
+        # Then build the CSR arrays straight from the edge records
+        edges = data["edges"]
+        n, m = len(self._node_table), len(edges)
+        src = np.fromiter((self._index[e["source"]] for e in edges), dtype=np.int32, count=m)
+        tgt = np.fromiter((self._index[e["target"]] for e in edges), dtype=np.int32, count=m)
+        codes = np.fromiter((EDGE_TYPE_CODES[EdgeType(e["type"])] for e in edges),
+                            dtype=np.uint8, count=m)
+
+        # Pass 1: count out-degrees and prefix-sum into row_ptr
+        row_ptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(src, minlength=n), out=row_ptr[1:])
+        # Pass 2: place each edge in its source row, keeping file order per row
+        order = np.argsort(src, kind="stable")
+        col_ind = tgt[order]
+        edge_type = codes[order]
+
+        # Per-node arrays are slices of the CSR rows
+        for node in self._node_table:
+            start, end = row_ptr[node.index], row_ptr[node.index + 1]
+            node.target_idx = array('i', col_ind[start:end].astype(np.intc).tobytes())
+            node.type_code = array('B', edge_type[start:end].tobytes())
+        self._install_csr(row_ptr, col_ind, edge_type)
+
+    def __getstate__(self):
+        # Generated traversal code can't be pickled; it is rebuilt on demand
+        state = self.__dict__.copy()
+        state["_compiled"] = None
+        state["_shape_queries"] = 0
+        return state
 
     def __repr__(self):
         return f"KnowledgeGraph({len(self.nodes)} nodes)"
@@ -0,0 +1,57 @@
+# tests/test_graph_visualization.py
+
+import pytest
+import os
+
+pytest.importorskip("networkx")
+pytest.importorskip("matplotlib")
+import utils.graph_visualization as graph_visualization
+from utils.graph_visualization import build_graph, compute_layout
+
+def _graph(edges=(("wood", "stick"),)):
+    nodes = sorted({n for edge in edges for n in edge})
+    return build_graph({"nodes": [{"id": n, "type": "event"} for n in nodes],
+                        "edges": [{"source": s, "target": t, "type": "IMPLIES"} for s, t in edges]})
+
+@pytest.fixture
+def layout_runs(monkeypatch):
+    runs = []
+    spring_layout = graph_visualization.nx.spring_layout
+
+    def counting_layout(G, **kwargs):
+        runs.append(G)
+        return spring_layout(G, **kwargs)
+    monkeypatch.setattr(graph_visualization.nx, "spring_layout", counting_layout)
+    return runs
+
+def test_compute_layout_sidecar_hit_and_miss(tmp_path, layout_runs):
+    cache = str(tmp_path / "graph.png.layout.json")
+    G = _graph()
+    pos = compute_layout(G, cache_path=cache)
+    assert len(layout_runs) == 1 and os.path.exists(cache)
+
+    # Unchanged structure: positions come from the sidecar
+    cached = compute_layout(G, cache_path=cache)
+    assert len(layout_runs) == 1
+    assert set(cached) == set(pos)
+    assert all(cached[n] == pytest.approx(tuple(pos[n])) for n in pos)
+
+    # New structure: recomputed
+    compute_layout(_graph((("wood", "stick"), ("stick", "torch"))), cache_path=cache)
+    assert len(layout_runs) == 2
+    assert os.listdir(tmp_path) == ["graph.png.layout.json"]
+
+# Truncated, not an object, and the right digest (%s) without positions
+@pytest.mark.parametrize("content", [b'{"digest": "0123', b'[1, 2]', b'{"digest": "%s", "pos": {}}'])
+def test_compute_layout_recovers_from_bad_sidecar(tmp_path, layout_runs, content):
+    cache = tmp_path / "graph.png.layout.json"
+    G = _graph()
+    if b"%s" in content:
+        content %= graph_visualization.layout_digest(G).encode()
+    cache.write_bytes(content)
+
+    pos = compute_layout(G, cache_path=str(cache))
+    assert set(pos) == {"wood", "stick"} and len(layout_runs) == 1
+    # The sidecar is rewritten and used next time
+    compute_layout(G, cache_path=str(cache))
+    assert len(layout_runs) == 1
@@ -1,10 +1,14 @@
 # tests/test_knowledge_graph.py
 
 import pytest
-from graph.knowledge_graph import KnowledgeGraph, EdgeType
+from graph.knowledge_graph import KnowledgeGraph, EdgeType, Node, Edge
+from graph._specialize import specialize_traversal
+import graph.knowledge_graph as knowledge_graph
 import sys
 import os
 import tempfile
+import copy
+import pickle
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 def test_add_node_and_edge():
@@ -18,6 +22,35 @@ def test_add_node_and_edge():
     assert len(kg.get_node("has_iron_pickaxe").edges) == 1
     assert kg.get_node("has_iron_pickaxe").edges[0].target.id == "mine_diamond"
 
+def test_node_add_edge_goes_through_graph():
+    kg = KnowledgeGraph()
+    for node_id in ["a", "b", "c"]:
+        kg.add_node(node_id, "event")
+    kg.add_edge("a", "b", EdgeType.AND)
+    assert kg.traverse_for_goal("b") == ["a", "b"]
+
+    c, b = kg.get_node("c"), kg.get_node("b")
+    c.add_edge(Edge(c, b, EdgeType.AND))
+    assert kg.traverse_for_goal("b") == ["a", "c", "b"]
+    assert [e.target.id for e in c.edges] == ["b"]
+    # Edges are read-only views
+    with pytest.raises(AttributeError):
+        c.edges.append(Edge(c, b, EdgeType.OR))
+    with pytest.raises(ValueError):
+        c.add_edge(Edge(c, Node("other", "event"), EdgeType.AND))
+
+    # Standalone nodes keep their own edges
+    x, y = Node("x", "event"), Node("y", "event")
+    x.add_edge(Edge(x, y, EdgeType.IMPLIES))
+    assert [repr(e) for e in x.edges] == ["x -[IMPLIES]-> y"]
+
+def test_node_ids_are_interned():
+    kg = KnowledgeGraph()
+    node_id = "".join(["craft_", "iron_", "pickaxe"])  # built at runtime, not interned
+    node = kg.add_node(node_id, "event")
+    assert node.id is sys.intern("craft_iron_pickaxe")
+    assert kg.add_node("craft_iron_pickaxe", "event") is node
+
 def test_traversal_order():
     kg = KnowledgeGraph()
     kg.add_node("wood", "event")
@@ -29,6 +62,20 @@ def test_traversal_order():
     path = kg.traverse_for_goal("pickaxe")
     assert path == ["wood", "stick", "pickaxe"]
 
+def test_shared_prerequisite_visited_once():
+    kg = KnowledgeGraph()
+    kg.add_node("wood", "item")
+    kg.add_node("planks", "item")
+    kg.add_node("stick", "item")
+    kg.add_node("pickaxe", "tool")
+    kg.add_edge("wood", "planks", EdgeType.IMPLIES)
+    kg.add_edge("planks", "stick", EdgeType.IMPLIES)
+    kg.add_edge("planks", "pickaxe", EdgeType.AND)
+    kg.add_edge("stick", "pickaxe", EdgeType.AND)
+
+    path = kg.traverse_for_goal("pickaxe")
+    assert path == ["wood", "planks", "stick", "pickaxe"]
+
 def test_or_logic():
     kg = KnowledgeGraph()
     kg.add_node("coal", "item")
@@ -64,6 +111,22 @@ def test_save_and_load():
     path_result = kg2.traverse_for_goal("pickaxe")
     assert path_result == ["iron", "pickaxe"]
     
+def test_save_recreates_removed_directory(tmp_path):
+    kg = KnowledgeGraph()
+    kg.add_node("iron", "item")
+    out_dir = tmp_path / "autosave"
+    path = str(out_dir / "graph.json")
+    kg.save_to_json(path)
+
+    # Directory cleaned up between autosaves
+    os.remove(path)
+    out_dir.rmdir()
+    kg.save_to_json(path)
+
+    kg2 = KnowledgeGraph()
+    kg2.load_from_json(path)
+    assert "iron" in kg2.nodes
+
 def test_update_node():
     kg = KnowledgeGraph()
     kg.add_node("crafting_table", "tool", {"uses": 1})
@@ -83,6 +146,20 @@ def test_prune_node():
     assert "useless" not in kg.nodes
     assert len(kg.get_node("valuable").edges) == 0
 
+def test_prune_node_updates_traversal():
+    kg = KnowledgeGraph()
+    kg.add_node("wood", "item")
+    kg.add_node("stick", "item")
+    kg.add_node("pickaxe", "tool")
+    kg.add_edge("wood", "stick", EdgeType.IMPLIES)
+    kg.add_edge("stick", "pickaxe", EdgeType.IMPLIES)
+    kg.add_edge("wood", "pickaxe", EdgeType.AND)
+    assert kg.traverse_for_goal("pickaxe") == ["wood", "stick", "pickaxe"]
+
+    kg.prune_node("stick")
+    assert kg.traverse_for_goal("pickaxe") == ["wood", "pickaxe"]
+    assert [e.target.id for e in kg.get_node("wood").edges] == ["pickaxe"]
+
 def test_prune_failed_nodes():
     kg = KnowledgeGraph()
     kg.add_node("bad_skill", "event", {"failed": True})
@@ -92,6 +169,67 @@ def test_prune_failed_nodes():
     assert "bad_skill" not in kg.nodes
     assert "good_skill" in kg.nodes
 
+def test_prune_failed_nodes_after_update():
+    kg = KnowledgeGraph()
+    kg.add_node("wood", "item")
+    kg.add_node("risky_skill", "event")
+    kg.add_edge("wood", "risky_skill", EdgeType.AND)
+    kg.update_node("risky_skill", data={"failed": True})
+    kg.prune_failed_nodes()
+
+    assert "risky_skill" not in kg.nodes
+    assert len(kg.get_node("wood").edges) == 0
+
+def test_prune_failed_batch_with_cross_edges():
+    kg = KnowledgeGraph()
+    for node_id in ["wood", "bad_a", "stick", "bad_b", "torch", "lonely", "bad_c"]:
+        kg.add_node(node_id, "event", {"failed": node_id.startswith("bad")})
+    for source, target, edge_type in [("wood", "bad_a", EdgeType.AND),
+                                      ("bad_a", "stick", EdgeType.AND),
+                                      ("wood", "stick", EdgeType.AND),
+                                      ("bad_a", "bad_b", EdgeType.IMPLIES),  # between failed nodes
+                                      ("bad_b", "bad_a", EdgeType.OR),
+                                      ("bad_b", "stick", EdgeType.OR),
+                                      ("stick", "torch", EdgeType.AND),
+                                      ("bad_b", "wood", EdgeType.NOT)]:
+        kg.add_edge(source, target, edge_type)
+    assert kg.traverse_for_goal("torch") == ["wood", "bad_b", "bad_a", "stick", "torch"]
+
+    kg.prune_failed_nodes()
+    assert set(kg.nodes) == {"wood", "stick", "torch", "lonely"}
+    assert [repr(e) for e in kg.get_node("wood").edges] == ["wood -[AND]-> stick"]
+    assert [repr(e) for e in kg.get_node("stick").edges] == ["stick -[AND]-> torch"]
+    assert kg.get_node("torch").edges == () and kg.get_node("lonely").edges == ()
+    assert kg.traverse_for_goal("torch") == ["wood", "stick", "torch"]
+    assert kg.traverse_for_goal("lonely") == ["lonely"]
+
+    # A later mutation recompiles from the node arrays and agrees
+    kg.add_node("coal", "item")
+    assert kg.traverse_for_goal("torch") == ["wood", "stick", "torch"]
+
+def test_prune_failed_nodes_after_direct_data_write():
+    kg = KnowledgeGraph()
+    kg.add_node("wood", "item")
+    kg.add_node("risky_skill", "event")
+    kg.add_edge("wood", "risky_skill", EdgeType.AND)
+    kg.get_node("risky_skill").data["failed"] = True
+    kg.prune_failed_nodes()
+
+    assert "risky_skill" not in kg.nodes
+    assert len(kg.get_node("wood").edges) == 0
+
+def test_direct_visited_write_blocks_not_dependents():
+    kg = KnowledgeGraph()
+    kg.add_node("no_pickaxe", "state")
+    kg.add_node("mine", "event")
+    kg.add_edge("no_pickaxe", "mine", EdgeType.NOT)
+    kg.get_node("no_pickaxe").data["visited"] = True
+    assert kg.traverse_for_goal("mine") == []
+
+    # Replacing the whole dict is seen as well
+    kg.get_node("no_pickaxe").data = {}
+    assert kg.traverse_for_goal("mine") == ["mine"]
+
 def test_not_logic_blocks_path():
     kg = KnowledgeGraph()
     kg.add_node("no_pickaxe", "state", {"visited": True})
@@ -109,3 +247,172 @@ def test_success_rate_update():
     node = kg.get_node("build")
     assert node.data["success_rate"] == 0.9
     assert node.data["visited"] is True
+
+def test_compile_csr_layout():
+    kg = KnowledgeGraph()
+    kg.add_node("wood", "item")
+    kg.add_node("stick", "item")
+    kg.add_node("torch", "event")
+    kg.add_edge("wood", "stick", EdgeType.IMPLIES)
+    kg.add_edge("wood", "torch", EdgeType.AND)
+    kg.add_edge("stick", "torch", EdgeType.AND)
+
+    kg._compile_csr()
+    assert kg._row_ptr.tolist() == [0, 2, 3, 3]
+    assert [kg._ids[i] for i in kg._col_ind] == ["stick", "torch", "torch"]
+    # CSC mirror lists incoming sources per target
+    assert kg._in_row_ptr.tolist() == [0, 0, 1, 3]
+    assert [kg._ids[i] for i in kg._in_col_ind] == ["wood", "wood", "stick"]
+
+    # Mutations invalidate the compiled arrays
+    kg.add_node("coal", "item")
+    kg.add_edge("coal", "torch", EdgeType.OR)
+    kg._compile_csr()
+    assert kg._row_ptr.tolist() == [0, 2, 3, 3, 4]
+
+def test_traversal_cache_tracks_mutations():
+    kg = KnowledgeGraph()
+    kg.add_node("no_pickaxe", "state")
+    kg.add_node("mine", "event")
+    kg.add_edge("no_pickaxe", "mine", EdgeType.NOT)
+    assert kg.traverse_for_goal("mine") == ["mine"]
+
+    # Same version: served from the cache, but callers get their own list
+    kg.traverse_for_goal("mine").append("oops")
+    assert kg.traverse_for_goal("mine") == ["mine"]
+
+    kg.update_node("no_pickaxe", data={"visited": True})
+    assert kg.traverse_for_goal("mine") == []
+
+    # Direct writes to node data invalidate cached paths too
+    kg.get_node("no_pickaxe").data["visited"] = False
+    assert kg.traverse_for_goal("mine") == ["mine"]
+    del kg.get_node("no_pickaxe").data["visited"]
+    assert kg.traverse_for_goal("mine") == ["mine"]
+    kg.get_node("no_pickaxe").data.update(visited=True)
+    assert kg.traverse_for_goal("mine") == []
+
+def test_copied_graph_traverses_independently(monkeypatch):
+    monkeypatch.setattr(knowledge_graph, "HAVE_NUMBA", False)
+    kg = KnowledgeGraph()
+    kg.add_node("a", "event")
+    kg.add_node("b", "event")
+    kg.add_edge("a", "b", EdgeType.AND)
+    # Warm the cache and the generated traversal code
+    for _ in range(knowledge_graph.SPECIALIZE_AFTER + 1):
+        assert kg.traverse_for_goal("b") == ["a", "b"]
+
+    for kg2 in (copy.deepcopy(kg), pickle.loads(pickle.dumps(kg))):
+        kg2.add_node("c", "event")
+        kg2.add_edge("c", "b", EdgeType.AND)
+        assert kg2.traverse_for_goal("b") == ["a", "c", "b"]
+        assert kg.traverse_for_goal("b") == ["a", "b"]
+
+def test_copied_graph_mirrors_direct_data_writes():
+    kg = KnowledgeGraph()
+    kg.add_node("no_pickaxe", "state")
+    kg.add_node("mine", "event")
+    kg.add_node("risky_skill", "event")
+    kg.add_edge("no_pickaxe", "mine", EdgeType.NOT)
+
+    for kg2 in (copy.deepcopy(kg), pickle.loads(pickle.dumps(kg))):
+        kg2.get_node("no_pickaxe").data["visited"] = True
+        assert kg2.traverse_for_goal("mine") == []
+        kg2.get_node("risky_skill").data["failed"] = True
+        kg2.prune_failed_nodes()
+        assert "risky_skill" not in kg2.nodes
+
+    # The original is untouched
+    assert kg.traverse_for_goal("mine") == ["mine"]
+    assert "risky_skill" in kg.nodes
+
+def test_deep_chain_traversal():
+    kg = KnowledgeGraph()
+    depth = 5000  # well past the default recursion limit
+    for i in range(depth):
+        kg.add_node(f"step_{i}", "event")
+    for i in range(depth - 1):
+        kg.add_edge(f"step_{i}", f"step_{i + 1}", EdgeType.IMPLIES)
+
+    path = kg.traverse_for_goal(f"step_{depth - 1}")
+    assert path == [f"step_{i}" for i in range(depth)]
+
+def test_readd_pruned_node():
+    kg = KnowledgeGraph()
+    kg.add_node("coal", "item")
+    kg.add_node("torch", "event")
+    kg.add_edge("coal", "torch", EdgeType.OR)
+    kg.prune_node("coal")
+
+    # The re-added node gets a fresh index; the old slot stays empty
+    kg.add_node("coal", "item")
+    kg.add_edge("coal", "torch", EdgeType.AND)
+    assert kg.get_node("coal").index == 2
+    assert repr(kg.get_node("coal").edges[0]) == "coal -[AND]-> torch"
+    assert kg.traverse_for_goal("torch") == ["coal", "torch"]
+
+def test_specialized_traversal_matches_kernel():
+    kg = KnowledgeGraph()
+    for node_id in ["wood", "planks", "coal", "charcoal", "torch", "blocked", "rain"]:
+        kg.add_node(node_id, "event")
+    kg.add_edge("wood", "planks", EdgeType.IMPLIES)
+    kg.add_edge("planks", "torch", EdgeType.AND)
+    kg.add_edge("coal", "torch", EdgeType.OR)
+    kg.add_edge("charcoal", "torch", EdgeType.OR)
+    kg.add_edge("rain", "torch", EdgeType.NOT)
+    kg.add_edge("torch", "blocked", EdgeType.AND)
+    kg.add_edge("rain", "blocked", EdgeType.NOT)
+    kg._compile_csr()
+
+    traverse = specialize_traversal(kg._in_row_ptr, kg._in_col_ind, kg._in_edge_type,
+                                    kg._or_rank, [True] * len(kg._ids))
+    flags = [False] * len(kg._ids)
+    path = [kg._ids[i] for i in traverse(kg._index["blocked"], flags)]
+    assert path == kg.traverse_for_goal("blocked") == ["wood", "planks", "charcoal", "torch", "blocked"]
+
+    flags[kg._index["rain"]] = True
+    assert traverse(kg._index["blocked"], flags) == []
+
+def _layered_graph(width=200, depth=10):
+    kg = KnowledgeGraph()
+    for d in range(depth):
+        for w in range(width):
+            kg.add_node(f"n{d}_{w}", "event")
+    for d in range(1, depth):
+        for w in range(width):
+            kg.add_edge(f"n{d - 1}_{w}", f"n{d}_{w}", EdgeType.AND)
+            kg.add_edge(f"n{d - 1}_{(w + 1) % width}", f"n{d}_{w}", EdgeType.OR)
+    return kg
+
+def test_specialization_waits_for_repeated_queries(monkeypatch):
+    monkeypatch.setattr(knowledge_graph, "HAVE_NUMBA", False)
+    kg = _layered_graph()
+    goals = [f"n9_{w}" for w in range(knowledge_graph.SPECIALIZE_AFTER + 2)]
+
+    # Cold queries run the kernel without generating any code
+    expected = [kg.traverse_for_goal(goal) for goal in goals[:knowledge_graph.SPECIALIZE_AFTER]]
+    assert kg._compiled is None
+    assert [kg.traverse_for_goal(goal) for goal in goals[knowledge_graph.SPECIALIZE_AFTER:]]
+    assert callable(kg._compiled)
+
+    # The specialized code agrees with the kernel, and edge changes drop it
+    kg._paths.clear()
+    assert [kg.traverse_for_goal(goal) for goal in goals[:knowledge_graph.SPECIALIZE_AFTER]] == expected
+    kg.add_edge("n0_0", "n9_0", EdgeType.AND)
+    kg.traverse_for_goal("n9_0")
+    assert kg._compiled is None
+
+def test_deep_chain_specialization_falls_back_once(monkeypatch):
+    monkeypatch.setattr(knowledge_graph, "HAVE_NUMBA", False)
+    kg = KnowledgeGraph()
+    depth = 5000
+    for i in range(depth):
+        kg.add_node(f"step_{i}", "event")
+    for i in range(depth - 1):
+        kg.add_edge(f"step_{i}", f"step_{i + 1}", EdgeType.IMPLIES)
+
+    for goal in range(depth - 1, depth - 3 - knowledge_graph.SPECIALIZE_AFTER, -1):
+        path = kg.traverse_for_goal(f"step_{goal}")
+        assert path == [f"step_{i}" for i in range(goal + 1)]
+    # Too deep for the generated code: remembered for this shape
+    assert kg._compiled is False
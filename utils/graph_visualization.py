@@ -1,8 +1,14 @@
 
-import json, os, argparse
+import json, os, argparse, hashlib, tempfile
 import networkx as nx
+import numpy as np
 import matplotlib.pyplot as plt
 
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib json module
+    orjson = None
+
 TYPE_COLORS = {
     "event":   "#FFEEAD",
     "context": "#B5EAD7",
@@ -16,43 +22,130 @@ EDGE_STYLE = {
     "NOT":     {"color": "#c0392b", "style": "dashed", "width": 2.4},
 }
 
+# Palette lookups for vectorized attribute mapping; the last type entry is the default
+TYPE_INDEX = {t: i for i, t in enumerate(TYPE_COLORS)}
+TYPE_PALETTE = np.array(list(TYPE_COLORS.values()) + ["#E0E0E0"])
+EDGE_INDEX = {t: i for i, t in enumerate(EDGE_STYLE)}
+EDGE_COLORS = np.array([st["color"] for st in EDGE_STYLE.values()])
+EDGE_WIDTHS = np.array([st["width"] for st in EDGE_STYLE.values()])
+EDGE_DASHED = np.array([st["style"] == "dashed" for st in EDGE_STYLE.values()])
+
 def load_graph_json(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def build_graph(data):
-    G = nx.DiGraph()
+def _dumps(obj):
+    # Compact UTF-8 bytes; matches orjson output for the structures used here
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def build_graph(data, G=None):
+    # Reuse a caller-supplied graph across repeated renders
+    if G is None:
+        G = nx.DiGraph()
+    else:
+        G.clear()
     for n in data["nodes"]:
         G.add_node(n["id"], type=n.get("type",""), **(n.get("data", {}) or {}))
     for e in data["edges"]:
         G.add_edge(e["source"], e["target"], etype=e.get("type", "IMPLIES"))
     return G
 
-def draw(G, with_labels=True, width=10, height=6, dpi=140):
+def graph_columns(G):
+    """Node and edge attributes of G gathered in one pass into NumPy columns for draw()."""
+    nodes = list(G.nodes(data=True))
+    edges = list(G.edges(data=True))
+    n_default, e_default = len(TYPE_COLORS), EDGE_INDEX["IMPLIES"]
+    return {
+        "nodes": [nid for nid, _ in nodes],
+        "type": np.fromiter((TYPE_INDEX.get(a.get("type", ""), n_default) for _, a in nodes),
+                            dtype=np.intp, count=len(nodes)),
+        "conf": np.fromiter((float(a.get("confidence", a.get("success_rate", 0.0)) or 0.0)
+                             for _, a in nodes), dtype=np.float32, count=len(nodes)),
+        "visited": np.fromiter((bool(a.get("visited", False)) for _, a in nodes),
+                               dtype=np.bool_, count=len(nodes)),
+        "edges": [(u, v) for u, v, _ in edges],
+        "etype": [a.get("etype", "IMPLIES") for _, _, a in edges],
+        "style": np.fromiter((EDGE_INDEX.get(a.get("etype", "IMPLIES"), e_default) for _, _, a in edges),
+                             dtype=np.intp, count=len(edges)),
+    }
+
+def layout_digest(G):
+    """Hash of the node/edge ids; the layout only depends on the structure."""
+    key = [sorted(map(str, G.nodes)), sorted([str(u), str(v)] for u, v in G.edges)]
+    return hashlib.blake2b(_dumps(key)).hexdigest()[:16]
+
+def _read_layout(G, cache_path, digest):
+    # Cached positions, or None if the sidecar is missing, stale or unreadable
+    try:
+        with open(cache_path, "rb") as f:
+            raw = f.read()
+        cached = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        if cached.get("digest") != digest:
+            return None
+        pos = {}
+        for n in G.nodes:
+            x, y = cached["pos"][str(n)]
+            pos[n] = (float(x), float(y))
+        return pos
+    except (OSError, ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+def _write_layout(pos, cache_path, digest):
+    # Written to a temp file and renamed, so readers never see a partial sidecar
+    payload = {"digest": digest,
+               "pos": {str(n): [float(x), float(y)] for n, (x, y) in pos.items()}}
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cache_path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_dumps(payload))
+        os.replace(tmp, cache_path)
+    except OSError:
+        # The cache is only an optimization; the layout itself is still valid
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def compute_layout(G, cache_path=None):
+    """
+    Spring layout of G. With cache_path, positions are read from / written to
+    that sidecar JSON so re-rendering an unchanged graph skips the simulation.
+    A missing, stale or corrupt sidecar just means the layout is recomputed.
+    """
+    digest = layout_digest(G) if cache_path else None
+    if cache_path:
+        pos = _read_layout(G, cache_path, digest)
+        if pos is not None:
+            return pos
+
     pos = nx.spring_layout(G, seed=42)
+    if cache_path:
+        _write_layout(pos, cache_path, digest)
+    return pos
+
+def draw(G, with_labels=True, width=10, height=6, dpi=140, pos=None):
+    if pos is None:
+        pos = compute_layout(G)
+    # Gathered on every call so attribute changes since build_graph are drawn
+    cols = graph_columns(G)
+
     # Nodes
-    node_colors, node_sizes, outlines = [], [], []
-    for nid, attrs in G.nodes(data=True):
-        node_colors.append(TYPE_COLORS.get(attrs.get("type",""), "#E0E0E0"))
-        conf = float(attrs.get("confidence", attrs.get("success_rate", 0.0)) or 0.0)
-        conf = min(max(conf, 0.0), 1.0)
-        node_sizes.append(600 + 1400 * conf)
-        outlines.append("#111111" if attrs.get("visited", False) else "#333333")
+    node_colors = np.take(TYPE_PALETTE, cols["type"])
+    node_sizes = 600 + 1400 * np.clip(cols["conf"], 0.0, 1.0)
+    outlines = np.where(cols["visited"], "#111111", "#333333")
 
     # Edges
-    solid, dashed = [], []
-    solid_colors, dashed_colors, solid_w, dashed_w = [], [], [], []
-    edge_labels = {}
-    for u, v, a in G.edges(data=True):
-        et = a.get("etype", "IMPLIES")
-        st = EDGE_STYLE.get(et, EDGE_STYLE["IMPLIES"])
-        (solid if st["style"] == "solid" else dashed).append((u, v))
-        (solid_colors if st["style"] == "solid" else dashed_colors).append(st["color"])
-        (solid_w if st["style"] == "solid" else dashed_w).append(st["width"])
-        edge_labels[(u, v)] = et
+    dashed_mask = EDGE_DASHED[cols["style"]]
+    colors, widths = EDGE_COLORS[cols["style"]], EDGE_WIDTHS[cols["style"]]
+    edgelist = cols["edges"]
+    solid = [edgelist[k] for k in np.flatnonzero(~dashed_mask)]
+    dashed = [edgelist[k] for k in np.flatnonzero(dashed_mask)]
+    solid_colors, solid_w = colors[~dashed_mask], widths[~dashed_mask]
+    dashed_colors, dashed_w = colors[dashed_mask], widths[dashed_mask]
+    edge_labels = dict(zip(edgelist, cols["etype"]))
 
     plt.figure(figsize=(width, height), dpi=dpi)
-    nx.draw_networkx_nodes(G, pos, node_color=node_colors, node_size=node_sizes,
+    nx.draw_networkx_nodes(G, pos, nodelist=cols["nodes"], node_color=node_colors, node_size=node_sizes,
                            edgecolors=outlines, linewidths=1.4)
     if solid:
         nx.draw_networkx_edges(G, pos, edgelist=solid, edge_color=solid_colors, width=solid_w,
@@ -77,10 +170,15 @@ def main():
 
     data = load_graph_json(args.input)
     G = build_graph(data)
-    fig = draw(G, with_labels=not args.no_labels)
 
     if args.out:
         os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        pos = compute_layout(G, cache_path=f"{args.out}.layout.json")
+    else:
+        pos = compute_layout(G)
+    fig = draw(G, pos=pos, with_labels=not args.no_labels)
+
+    if args.out:
         fig.tight_layout()
         fig.savefig(args.out, bbox_inches="tight")
         print(f"Wrote: {os.path.abspath(args.out)}")